@@ -7,103 +7,303 @@ Author: Raghav Kansal
 from __future__ import annotations
 
 import argparse
+import functools
 import json
+import re
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
 from XRootD import client
+from XRootD.client.flags import DirListFlags
 
 from boostedhh import hh_vars, utils
 
+# Users are indexed concurrently: each user's walk is latency-bound on XRootD round trips,
+# so interleaving users on threads hides that latency (the FileSystem handles and callback
+# machinery do not pickle, so threads rather than processes).
+_MAX_WORKERS = 8
+_EXECUTOR = ThreadPoolExecutor(max_workers=_MAX_WORKERS)
+_LOCAL = threading.local()
+
+# guards mutations of the shared files dict across per-user workers
+_FILES_LOCK = threading.Lock()
+
+
+def _get_fs(redirector: str) -> client.FileSystem:
+    """One FileSystem handle per worker thread.
+
+    Request submission is thread-safe (the callback-mode walk also submits from XRootD's
+    callback threads on one handle); separate handles just keep the concurrent per-user
+    walks from contending on a single connection.
+    """
+    if getattr(_LOCAL, "redirector", None) != redirector:
+        _LOCAL.fs = client.FileSystem(redirector)
+        _LOCAL.redirector = redirector
+    return _LOCAL.fs
+
+# In-process cache of directory listings, so paths listed more than once per run
+# (e.g. base_dir/user in the structure probe and again in the main loop) cost one RPC.
+# Failed listings are cached as None, so known-missing paths are not re-probed either.
+_DIRLIST_CACHE: dict[str, list[str] | None] = {}
+
+# existence cache for stat probes (path -> exists)
+_STAT_CACHE: dict[str, bool] = {}
+
+
+def _exists(fs, path) -> bool:
+    """Check (and cache) whether ``path`` exists on the server."""
+    key = str(path)
+    if key not in _STAT_CACHE:
+        status, _ = fs.stat(key)
+        _STAT_CACHE[key] = status.ok
+
+    return _STAT_CACHE[key]
+
 
 def _dirlist(fs, path) -> list:
-    status, listing = fs.dirlist(str(path))
+    key = str(path)
+    if key in _DIRLIST_CACHE:
+        cached = _DIRLIST_CACHE[key]
+        if cached is None:
+            raise FileNotFoundError(f"Directory known to be missing: {key}")
+        return cached
+
+    status, listing = fs.dirlist(key)
     if not status.ok:
+        _DIRLIST_CACHE[key] = None
         raise FileNotFoundError(f"Failed to list directory: {status}")
 
+    names = [f.name for f in listing]
+    _DIRLIST_CACHE[key] = names
+    return names
+
+
+# sentinel for "not in the listing cache" (None there marks known-missing paths)
+_UNCACHED = object()
+
+
+def _walk_tree_async(fs, roots: list[str], depth: int) -> dict[str, list[str]]:
+    """Traverse ``depth`` levels below each of ``roots`` entirely in XRootD callback mode.
+
+    Each completed listing submits its children's requests directly from the callback, so
+    requests stay in flight continuously instead of waiting for per-level barriers.
+    Returns a mapping from leaf directory path to its listing; raises FileNotFoundError if
+    any directory in the tree fails to list. Cached paths are served without a request.
+    """
+    if not roots:
+        return {}
+
+    leaves = {}
+    errors = []
+    lock = threading.Lock()
+    done = threading.Event()
+    # seeded with a guard token so pending cannot transiently hit 0 (setting done early and
+    # dropping later roots' listings) while roots are still being submitted; the token is
+    # released once all roots are in flight
+    pending = [1]
+
+    def _finish_one():
+        with lock:
+            pending[0] -= 1
+            if pending[0] == 0:
+                done.set()
+
+    def _on_listing(path, level, names):
+        if level == depth:
+            with lock:
+                leaves[path] = names
+        else:
+            for name in names:
+                _start(f"{path}/{name}", level + 1)
+        _finish_one()
+
+    def _on_error(path):
+        with lock:
+            errors.append(path)
+        _finish_one()
+
+    def _start(path, level):
+        with lock:
+            pending[0] += 1
+
+        cached = _DIRLIST_CACHE.get(path, _UNCACHED)
+        if cached is None:
+            _on_error(path)
+            return
+        if cached is not _UNCACHED:
+            _on_listing(path, level, cached)
+            return
+
+        def _callback(status, listing, _hostlist):
+            if not status.ok:
+                _DIRLIST_CACHE[path] = None
+                _on_error(path)
+                return
+            names = [f.name for f in listing]
+            _DIRLIST_CACHE[path] = names
+            _on_listing(path, level, names)
+
+        # a failed submission never invokes the callback, so route it through _on_error
+        # here to keep the pending count balanced
+        status = fs.dirlist(path, callback=_callback)
+        if not status.ok:
+            _on_error(path)
+
+    for root in roots:
+        _start(root, 0)
+    _finish_one()  # release the guard token
+
+    done.wait()
+
+    if errors:
+        raise FileNotFoundError(f"Failed to list directories: {errors}")
+
+    return leaves
+
+
+def _filter_root_files(names: list[str]) -> list[str]:
+    """Filter a listing down to its .root files with one vectorized scan."""
+    if not names:
+        return []
+
+    names = np.asarray(names)
+    return names[np.char.endswith(names, ".root")].tolist()
+
+
+def _dirlist_recursive(fs, path: Path) -> list[str] | None:
+    """Ask the server for one recursive listing of ``path``.
+
+    Returns entry paths relative to ``path``, or None if the server or binding does not
+    support recursive listings (in which case the caller walks level by level).
+    """
+    try:
+        status, listing = fs.dirlist(str(path), flags=DirListFlags.RECURSIVE)
+    except (TypeError, AttributeError):
+        return None
+
+    if not status.ok:
+        return None
+
     return [f.name for f in listing]
 
+
+def _walk_subsample_files(fs, redirector: str, spath: Path) -> dict[str, list[str]]:
+    """Walk the dataset/timestamp/chunk levels under ``spath``.
+
+    A single server-side recursive listing replaces the three levels of per-directory
+    round trips where supported; otherwise the tree is traversed in callback mode with
+    all listings in flight concurrently.
+    Returns a mapping from dataset directory name to its list of .root file URLs.
+    """
+    entries = _dirlist_recursive(fs, spath)
+    if entries is not None:
+        prefix = f"{redirector}{spath!s}/"
+        dataset_files = {}
+        for entry in entries:
+            # entries are dataset/timestamp/chunk/file paths relative to spath
+            parts = entry.strip("/").split("/")
+            dataset_files.setdefault(parts[0], [])
+            if len(parts) == 4 and parts[-1].endswith(".root"):
+                dataset_files[parts[0]].append(prefix + "/".join(parts))
+
+        return dataset_files
+
+    dataset_files = {f1: [] for f1 in _dirlist(fs, spath)}  # dataset directories
+
+    # expand through the timestamp and chunk (0000, 0001, etc.) directories in callback
+    # mode; the leaves are the chunk directories, two levels below each dataset directory
+    spath_str = str(spath)
+    leaves = _walk_tree_async(fs, [f"{spath_str}/{f1}" for f1 in dataset_files], depth=2)
+
+    base_len = len(spath_str) + 1
+    for f3path, names in sorted(leaves.items()):  # sorted for reproducible file order
+        f1 = f3path[base_len:].split("/", 1)[0]
+        prefix = f"{redirector}{f3path}/"
+        dataset_files[f1] += [prefix + f for f in _filter_root_files(names)]
+
+    return dataset_files
+
 def _has_new_structure(fs, base_dir, user, years):
-    """Check if the directory uses the new structure (data_{year}, mc_{year}) or old structure ({year})."""
-    user_path = base_dir / user
-    try:
-        user_contents = _dirlist(fs, user_path)
-    except FileNotFoundError:
-        return False
-    
-    # Check if any data_{year} or mc_{year} directories exist
+    """Check if the directory uses the new structure (data_{year}, mc_{year}) or old structure ({year}).
+
+    Probes directory existence with stat calls, short-circuiting on the first hit, instead of
+    listing the whole user directory.
+    """
     for year in years:
-        if f"data_{year}" in user_contents or f"mc_{year}" in user_contents:
-            return True
-    
+        for prefix in ("data", "mc"):
+            if _exists(fs, base_dir / user / f"{prefix}_{year}"):
+                return True
+
     return False
 
+# Subsample-name tokens → sample name. Alternation order follows the original if/elif
+# chains, but re.search resolves ties by the earliest match position in the name rather
+# than pure chain order. This deliberately fixes the chains' shadowed branches: e.g.
+# ParkingSingleMuon_* now classifies as ParkingSingleMuon, where the old "Muon" branch
+# made the ParkingSingleMuon branch unreachable.
+_DATA_SAMPLE_TOKENS = {
+    "JetMET": ["JetHT", "JetMET"],
+    "EGamma": ["EGamma"],
+    "Muon": ["Muon"],
+    "Tau": ["Tau"],
+    "BTagMu": ["BTagMu"],
+    "MuonEG": ["MuonEG"],
+    "ParkingVBF": ["ParkingVBF"],
+    "ParkingSingleMuon": ["ParkingSingleMuon"],
+}
+
+_MC_SAMPLE_TOKENS = {
+    "HH4b": ["HHto4B"],
+    "HHbbtt": ["HHto2B2Tau"],
+    "Hbb": ["Hto2B"],
+    "Hcc": ["Hto2C"],
+    "Htautau": ["Hto2Tau", "HTo2Tau"],
+    "QCD": ["QCD-4Jets_HT"],
+    "QCD_PT": ["QCD_PT"],
+    "TT": ["TTto"],
+    "SingleTop": ["TbarWplus", "TWminus", "TbarBQ", "TBbarQ"],
+    "DYJetsLO": ["DYto2L-4Jets"],
+    "DYJetsNLO": ["DYto2L-2Jets"],
+    "VJetsLO": ["Wto2Q-3Jets", "WtoLNu-4Jets", "Zto2Q-4Jets"],
+    "VJetsNLO": ["Wto2Q-2Jets", "WtoLNu-2Jets", "Zto2Q-2Jets"],
+    "Diboson": ["WW_", "WZ_", "ZZ_", "WWto4Q", "WWtoLNu2Q", "WZto3LNu", "WZto4Q", "ZZto2L2Q", "ZZto4L"],
+    "EWKV": ["VBFZto2Q", "VBFWto2Q", "VBFto2L", "VBFto2Nu", "VBFtoLNu"],
+    "VGamma": ["WGtoLNuG", "WGto2QG", "ZGto2NuG", "ZGto2QG"],
+}
+
+
+def _compile_sample_regex(sample_tokens: dict[str, list[str]]) -> re.Pattern:
+    """Combine all tokens into one alternation with a named group per sample."""
+    return re.compile(
+        "|".join(
+            f"(?P<{sample}>{'|'.join(map(re.escape, tokens))})"
+            for sample, tokens in sample_tokens.items()
+        )
+    )
+
+
+_DATA_SAMPLE_RE = _compile_sample_regex(_DATA_SAMPLE_TOKENS)
+_MC_SAMPLE_RE = _compile_sample_regex(_MC_SAMPLE_TOKENS)
+
+
+@functools.lru_cache(maxsize=4096)
 def _get_sample_from_subsample(subsample_name, is_data):
     """
-    Determine the sample name from the subsample name using the SAMPLES dictionary.
-    Source: 
+    Determine the sample name from the subsample name, via a single precompiled regex scan
+    over the name rather than one substring check per sample.
+    Source:
     - https://github.com/rkansal47/Run3_nano_submission/blob/40a74eeffd5d0b935629567dc291a32c9c43abb7/datasets/get_datasets.py
     - https://github.com/rkansal47/Run3_nano_submission/blob/40a74eeffd5d0b935629567dc291a32c9c43abb7/datasets/get_mc.py
-    """    
-    # If no match found, try to infer from common patterns
-    if is_data:
-        # Data
-        if "JetHT" in subsample_name or "JetMET" in subsample_name:
-            return "JetMET"
-        elif "EGamma" in subsample_name:
-            return "EGamma"
-        elif "Muon" in subsample_name:
-            return "Muon"
-        elif "Tau" in subsample_name:
-            return "Tau"
-        elif "BTagMu" in subsample_name:
-            return "BTagMu"
-        elif "MuonEG" in subsample_name:
-            return "MuonEG"
-        elif "ParkingVBF" in subsample_name:
-            return "ParkingVBF"
-        elif "ParkingSingleMuon" in subsample_name:
-            return "ParkingSingleMuon"
-        else:
-            raise ValueError(f"Could not determine sample from subsample name: {subsample_name}. Please check the naming conventions.")
-    else:
-        # MC
-        if "HHto4B" in subsample_name or "HHto2B2Tau" in subsample_name:
-            if "VBF" in subsample_name:
-                return "HHbbtt" if "2B2Tau" in subsample_name else "HH4b"
-            else:
-                return "HHbbtt" if "2B2Tau" in subsample_name else "HH4b"
-        elif "Hto2B" in subsample_name:
-            return "Hbb"
-        elif "Hto2C" in subsample_name:
-            return "Hcc"
-        elif "Hto2Tau" in subsample_name or "HTo2Tau" in subsample_name:
-            return "Htautau"
-        elif "QCD-4Jets_HT" in subsample_name:
-            return "QCD"
-        elif "QCD_PT" in subsample_name:
-            return "QCD_PT"
-        elif "TTto" in subsample_name:
-            return "TT"
-        elif any(x in subsample_name for x in ["TbarWplus", "TWminus", "TbarBQ", "TBbarQ"]):
-            return "SingleTop"
-        elif "DYto2L-4Jets" in subsample_name:
-            return "DYJetsLO"
-        elif "DYto2L-2Jets" in subsample_name:
-            return "DYJetsNLO"
-        elif any(x in subsample_name for x in ["Wto2Q-3Jets", "WtoLNu-4Jets", "Zto2Q-4Jets"]):
-            return "VJetsLO"
-        elif any(x in subsample_name for x in ["Wto2Q-2Jets", "WtoLNu-2Jets", "Zto2Q-2Jets"]):
-            return "VJetsNLO"
-        elif any(x in subsample_name for x in ["WW_", "WZ_", "ZZ_", "WWto4Q", "WWtoLNu2Q", "WZto3LNu", "WZto4Q", "ZZto2L2Q", "ZZto4L"]):
-            return "Diboson"
-        elif any(x in subsample_name for x in ["VBFZto2Q", "VBFWto2Q", "VBFto2L", "VBFto2Nu", "VBFtoLNu"]):
-            return "EWKV"
-        elif any(x in subsample_name for x in ["WGtoLNuG", "WGto2QG", "ZGto2NuG", "ZGto2QG"]):
-            return "VGamma"
-    
+    """
+    match = (_DATA_SAMPLE_RE if is_data else _MC_SAMPLE_RE).search(subsample_name)
+    if match is None:
         raise ValueError(f"Could not determine sample from subsample name: {subsample_name}. Please check the naming conventions.")
 
+    return match.lastgroup
+
 
 def xrootd_index_private_nano(
     base_dir: str,
@@ -153,13 +353,77 @@ def xrootd_index_private_nano(
         # no users to search for
         return {}
 
-    for user in users:
+    def _init_sample(year, sample):
+        with _FILES_LOCK:
+            if sample not in files[year]:
+                files[year][sample] = {}
+            elif overwrite_sample:
+                warnings.warn(f"Overwriting existing sample {sample}", stacklevel=2)
+                files[year][sample] = {}
+
+    def _process_subsample(fs, parent_path, year, sample, subsample, is_data, new_structure):
+        """Walk one subsample directory and record its files (shared by both structures).
+
+        Both structures have the same dataset/timestamp/chunk levels below the subsample
+        directory; they only differ in how the data subsample keys are derived from the
+        dataset directory names.
+        """
+        spath = parent_path / subsample
+
+        # Clean subsample name
+        subsample_name = subsample.split("_TuneCP5")[0].split("_LHEweights")[0]
+
+        if not is_data:
+            if subsample_name in files[year][sample]:
+                warnings.warn(
+                    f"Duplicate subsample found! {subsample=} ({subsample_name=}) for {year=}",
+                    stacklevel=2
+                )
+            print(f"\t\t\t\t{subsample_name}")
+
+        try:
+            dataset_files = _walk_subsample_files(fs, redirector, spath)
+        except FileNotFoundError:
+            print(f"\t\t\t\tWarning: Could not access {spath}")
+            return
+
+        if is_data:
+            # Process files per dataset directory
+            for f1, tfiles in dataset_files.items():
+                if new_structure:
+                    subsample_key = f"{sample}_{f1.replace('_DAZSLE_PFNano', '')}"
+                else:
+                    # For old-structure Data files, the dataset directory is the subsample name
+                    subsample_key = f1
+
+                with _FILES_LOCK:
+                    if subsample_key not in files[year][sample]:
+                        files[year][sample][subsample_key] = []
+                    files[year][sample][subsample_key].extend(tfiles)
+                print(f"\t\t\t\t\t{len(tfiles)} files added")
+        else:
+            # MC processes all files together
+            tfiles = [f for tfiles in dataset_files.values() for f in tfiles]
+            if "VBFHHto4B_CV-m2p12" in subsample_name or "VBFHHto4B_CV_m2p12" in subsample_name:
+                warnings.warn(
+                    "Renaming subsample VBFHHto4B_CV-m2p12 to VBFHHto4B_CV-2p12 due to mislabelling in MC.",
+                    stacklevel=2
+                )
+                subsample_name = subsample_name.replace("VBFHHto4B_CV-m2p12", "VBFHHto4B_CV-2p12")
+                subsample_name = subsample_name.replace("VBFHHto4B_CV_m2p12", "VBFHHto4B_CV_2p12")
+            with _FILES_LOCK:
+                files[year][sample][subsample_name] = tfiles
+            print(f"\t\t\t\t\t{len(tfiles)} files")
+
+    def _index_user(user):
+        fs = _get_fs(redirector)
         print(f"\t{user}")
-        
+
         for year in years:
             print(f"\t\t{year}")
-            if year not in files:
-                files[year] = {}
+            with _FILES_LOCK:
+                if year not in files:
+                    files[year] = {}
 
             if use_new_structure:
                 # New structure: separate data_{year} and mc_{year} directories
@@ -176,79 +440,25 @@ def xrootd_index_private_nano(
                         # else:
                         #     ypath = base_dir / user / f"mc_{year}"
                         ypath = base_dir / user / f"mc_{year}"
-                    
-                    tsubsamples = _dirlist(fs, ypath) if subsamples is None else subsamples
-                        
+
+                    try:
+                        tsubsamples = _dirlist(fs, ypath) if subsamples is None else subsamples
+                    except FileNotFoundError:
+                        # user has no data/mc directory for this year
+                        continue
+
                     for subsample in tsubsamples:
                         print(f"\t\t\tProcessing {subsample}")
                         sample = _get_sample_from_subsample(subsample, is_data)
-                        
+
                         # Filter by samples if specified
                         if samples is not None and sample not in samples:
                             continue
-                            
-                        if sample not in files[year]:
-                            files[year][sample] = {}
-                        elif overwrite_sample:
-                            warnings.warn(f"Overwriting existing sample {sample}", stacklevel=2)
-                            files[year][sample] = {}
 
+                        _init_sample(year, sample)
                         print(f"\t\t\t{sample}")
-                        spath = ypath / subsample
-
-                        # Clean subsample name
-                        subsample_name = subsample.split("_TuneCP5")[0].split("_LHEweights")[0]
-                        print(f"\t\t\t\t{subsample_name}")
-                        
-                        if not is_data:
-                            if subsample_name in files[year][sample]:
-                                warnings.warn(
-                                    f"Duplicate subsample found! {subsample=} ({subsample_name=}) for {year=}",
-                                    stacklevel=2
-                                )
-                            print(f"\t\t\t\t{subsample_name}")
-
-                        # Navigate through the directory structure (4 levels for new structure)
-                        try:
-                            for f1 in _dirlist(fs, spath):  # dataset directory
-                                f1path = spath / f1
-                                tfiles = []  # Reset for each dataset directory
-                                
-                                for f2 in _dirlist(fs, f1path):  # timestamp directory
-                                    f2path = f1path / f2
-                                    for f3 in _dirlist(fs, f2path):  # chunk directory (0000, 0001, etc.)
-                                        f3path = f2path / f3
-                                        f3_contents = _dirlist(fs, f3path)
-                                        root_files = [f for f in f3_contents if f.endswith(".root")]
-                                        if root_files:
-                                            tfiles += [f"{redirector}{f3path!s}/{f}" for f in root_files]
-
-                                # Process files for this specific dataset directory
-                                if is_data:
-                                    run_info = f1.replace("_DAZSLE_PFNano", "")
-                                    subsample_key = f"{sample}_{run_info}"
-                                    
-                                    if subsample_key not in files[year][sample]:
-                                        files[year][sample][subsample_key] = []
-                                    files[year][sample][subsample_key].extend(tfiles)
-                                    print(f"\t\t\t\t\t{len(tfiles)} files added")
-
-                            # Handle MC case outside the f1 loop since it processes all files together
-                            if not is_data:
-                                if "VBFHHto4B_CV-m2p12" in subsample_name or "VBFHHto4B_CV_m2p12" in subsample_name:
-                                    warnings.warn(
-                                        "Renaming subsample VBFHHto4B_CV-m2p12 to VBFHHto4B_CV-2p12 due to mislabelling in MC.",
-                                        stacklevel=2
-                                    )
-                                    subsample_name = subsample_name.replace("VBFHHto4B_CV-m2p12", "VBFHHto4B_CV-2p12")
-                                    subsample_name = subsample_name.replace("VBFHHto4B_CV_m2p12", "VBFHHto4B_CV_2p12")
-                                files[year][sample][subsample_name] = tfiles
-                                print(f"\t\t\t\t\t{len(tfiles)} files")
-                                
-                        except FileNotFoundError:
-                            print(f"\t\t\t\tWarning: Could not access {spath}")
-                            continue
-                            
+                        _process_subsample(fs, ypath, year, sample, subsample, is_data, True)
+
             else:
                 # Old structure: single year directory
                 ypath = base_dir / user / year
@@ -256,67 +466,24 @@ def xrootd_index_private_nano(
                     tsamples = _dirlist(fs, ypath) if samples is None else samples
                 except FileNotFoundError:
                     continue
-                    
-                for sample in tsamples:
-                    if sample not in files[year]:
-                        files[year][sample] = {}
-                    elif overwrite_sample:
-                        warnings.warn(f"Overwriting existing sample {sample}", stacklevel=2)
-                        files[year][sample] = {}
 
+                for sample in tsamples:
+                    _init_sample(year, sample)
                     print(f"\t\t\t{sample}")
                     spath = ypath / sample
 
-                    is_data = sample in hh_vars.DATA_SAMPLES
+                    is_data = sample in hh_vars.DATA_SAMPLES_SET
 
                     try:
                         tsubsamples = _dirlist(fs, spath) if subsamples is None else subsamples
                     except FileNotFoundError:
                         continue
-                        
+
                     for subsample in tsubsamples:
-                        subsample_name = subsample.split("_TuneCP5")[0].split("_LHEweights")[0]
-                        if not is_data:
-                            if subsample_name in files[year][sample]:
-                                warnings.warn(
-                                    f"Duplicate subsample found! {subsample_name}", stacklevel=2
-                                )
-
-                            print(f"\t\t\t\t{subsample_name}")
-
-                        sspath = spath / subsample
-                        try:
-                            for f1 in _dirlist(fs, sspath):
-                                # For Data files, f1 is the subsample name
-                                if is_data:
-                                    if f1 in files[year][sample]:
-                                        warnings.warn(f"Duplicate subsample found! {f1}", stacklevel=2)
-
-                                    print(f"\t\t\t\t{f1}")
-
-                                f1path = sspath / f1
-                                for f2 in _dirlist(fs, f1path):
-                                    f2path = f1path / f2
-                                    tfiles = []
-                                    for f3 in _dirlist(fs, f2path):
-                                        f3path = f2path / f3
-                                        tfiles += [
-                                            f"{redirector}{f3path!s}/{f}"
-                                            for f in _dirlist(fs, f3path)
-                                            if f.endswith(".root")
-                                        ]
-
-                                if is_data:
-                                    files[year][sample][f1] = tfiles
-                                    print(f"\t\t\t\t\t{len(tfiles)} files")
-
-                            if not is_data:
-                                files[year][sample][subsample_name] = tfiles
-                                print(f"\t\t\t\t\t{len(tfiles)} files")
-                                
-                        except FileNotFoundError:
-                            print(f"\t\t\t\tWarning: Could not access {sspath}")
-                            continue
+                        _process_subsample(fs, spath, year, sample, subsample, is_data, False)
+
+    # fan the per-user walks out to the thread pool; list() propagates any worker exceptions
+    list(_EXECUTOR.map(_index_user, users))
 
     return files
 
@@ -387,33 +554,38 @@ def main():
 
     args = parser.parse_args()
 
-    if args.append:
-        # check if output file exists for each year; if so, load and save to files dict.
-        files = {}
-        for year in args.years:
+    # index and write one year at a time, so each year's JSON hits disk as soon as it is
+    # complete and only a single year's file index is held in memory
+    for year in args.years:
+        files = None
+        if args.append:
+            # check if an output file exists for this year; if so, load it to append to.
             try:
                 with Path(f"{args.out_name}_{year}.json").open() as f:
-                    files[year] = json.load(f)
+                    files = {year: json.load(f)}
             except FileNotFoundError:
-                continue
-    else:
-        files = None
-
-    files = xrootd_index_private_nano(
-        args.base_dir,
-        args.redirector,
-        args.users,
-        args.years,
-        args.samples,
-        args.subsamples,
-        files,
-        args.overwrite_sample,
-    )
-
-    # save files per year
-    for year in files:
+                pass
+
+        files = xrootd_index_private_nano(
+            args.base_dir,
+            args.redirector,
+            args.users,
+            [year],
+            args.samples,
+            args.subsamples,
+            files,
+            args.overwrite_sample,
+        )
+
+        # only write years that were actually indexed, so e.g. an empty users listing
+        # does not clobber an existing index with {}
+        if year not in files:
+            continue
+
+        # compact encoding: the indices run to hundreds of MB pretty-printed;
+        # pipe through `jq` to inspect them
         with Path(f"{args.out_name}_{year}.json").open("w") as f:
-            json.dump(files[year], f, indent=4)
+            json.dump(files[year], f, separators=(",", ":"))
 
 
 if __name__ == "__main__":
@@ -27,6 +27,7 @@ LUMI = {
 
 
 DATA_SAMPLES = ["JetHT", "JetMET", "Muon", "EGamma", "Tau"]
+DATA_SAMPLES_SET = frozenset(DATA_SAMPLES)  # for membership tests
 
 # sample key -> list of samples or selectors
 common_samples_bg = {
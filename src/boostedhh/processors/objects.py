@@ -5,57 +5,169 @@ from __future__ import annotations
 import awkward as ak
 import numpy as np
 
+# bits of the packed jet ID flags computed by the flat kernels
+_JETID_TIGHT = np.uint8(1 << 0)
+_JETID_TIGHTLEPVETO = np.uint8(1 << 1)
+
+
+def _pack_jetid_flags(jetidtight: np.ndarray, jetidtightlepveto: np.ndarray) -> np.ndarray:
+    """Pack the two boolean masks into one uint8 flag array."""
+    return (jetidtight * _JETID_TIGHT) | (jetidtightlepveto * _JETID_TIGHTLEPVETO)
+
+
+def _unpack_jetid_flags(flags: np.ndarray, counts: ak.Array) -> tuple[ak.Array, ak.Array]:
+    """Unpack the uint8 flags into boolean masks with the event structure restored.
+
+    The masks are returned as booleans since awkward interprets integer jagged arrays as
+    indices rather than masks.
+    """
+    jetidtight = ak.unflatten((flags & _JETID_TIGHT) != 0, counts)
+    jetidtightlepveto = ak.unflatten((flags & _JETID_TIGHTLEPVETO) != 0, counts)
+    return jetidtight, jetidtightlepveto
+
+
+def _jetid_v12_flat(
+    eta: np.ndarray,
+    jetId: np.ndarray,
+    neHEF: np.ndarray,
+    neEmEF: np.ndarray,
+    muEF: np.ndarray,
+    chEmEF: np.ndarray,
+) -> np.ndarray:
+    """v12 jet ID over flat numpy buffers, returning packed uint8 flags.
+
+    Each eta-region term is accumulated into a shared scratch buffer with out= / in-place
+    ops, so the kernel reuses a fixed set of arrays instead of allocating one per
+    subexpression. (The input buffers may be views of the awkward arrays, so they are
+    never written to.)
+    """
+    abseta = np.abs(eta)
+    central = abseta <= 2.7
+    jetidtightbit = (jetId & 2) == 2
+    scratch = np.empty_like(central)
+
+    # central region: |eta| <= 2.7
+    jetidtight = central & jetidtightbit
+
+    # endcap region: 2.7 < |eta| <= 3.0
+    np.less_equal(abseta, 3.0, out=scratch)
+    scratch &= ~central
+    scratch &= jetidtightbit
+    scratch &= neHEF < 0.99
+    jetidtight |= scratch
+
+    # forward region: |eta| > 3.0
+    np.greater(abseta, 3.0, out=scratch)
+    scratch &= jetidtightbit
+    scratch &= neEmEF < 0.4
+    jetidtight |= scratch
+
+    jetidtightlepveto = central & jetidtight
+    jetidtightlepveto &= muEF < 0.8
+    jetidtightlepveto &= chEmEF < 0.8
+    np.logical_not(central, out=scratch)
+    scratch &= jetidtight
+    jetidtightlepveto |= scratch
+
+    return _pack_jetid_flags(jetidtight, jetidtightlepveto)
+
 
 def jetid_v12(jets: ak.Array) -> ak.Array:
     """
     Jet ID fix for NanoAOD v12 copying
     # https://gitlab.cern.ch/cms-jetmet/coordination/coordination/-/issues/117#note_8880716
     """
-
-    jetidtightbit = (jets.jetId & 2) == 2
-    jetidtight = (
-        ((np.abs(jets.eta) <= 2.7) & jetidtightbit)
-        | (
-            ((np.abs(jets.eta) > 2.7) & (np.abs(jets.eta) <= 3.0))
-            & jetidtightbit
-            & (jets.neHEF < 0.99)
+    counts = ak.num(jets.eta)
+    flags = _jetid_v12_flat(
+        *(
+            ak.to_numpy(ak.flatten(jets[field]))
+            for field in ("eta", "jetId", "neHEF", "neEmEF", "muEF", "chEmEF")
         )
-        | ((np.abs(jets.eta) > 3.0) & jetidtightbit & (jets.neEmEF < 0.4))
     )
 
-    jetidtightlepveto = (
-        (np.abs(jets.eta) <= 2.7) & jetidtight & (jets.muEF < 0.8) & (jets.chEmEF < 0.8)
-    ) | ((np.abs(jets.eta) > 2.7) & jetidtight)
+    return _unpack_jetid_flags(flags, counts)
 
-    return jetidtight, jetidtightlepveto
+
+def _jetid_v14_flat(
+    eta: np.ndarray,
+    neHEF: np.ndarray,
+    neEmEF: np.ndarray,
+    chHEF: np.ndarray,
+    muEF: np.ndarray,
+    chEmEF: np.ndarray,
+    chMultiplicity: np.ndarray,
+    neMultiplicity: np.ndarray,
+) -> np.ndarray:
+    """v14 jet ID over flat numpy buffers, returning packed uint8 flags.
+
+    Each eta-region term is accumulated into a shared scratch buffer with out= / in-place
+    ops, so the kernel reuses a fixed set of arrays instead of allocating one per
+    subexpression. (The input buffers may be views of the awkward arrays, so they are
+    never written to.)
+    """
+    abseta = np.abs(eta)
+    inner = abseta <= 2.6
+    central = abseta <= 2.7
+    scratch = np.empty_like(inner)
+
+    # inner region: |eta| <= 2.6
+    jetidtight = inner & (neHEF < 0.99)
+    jetidtight &= neEmEF < 0.9
+    jetidtight &= (chMultiplicity + neMultiplicity) > 1
+    jetidtight &= chHEF > 0.01
+    jetidtight &= chMultiplicity > 0
+
+    # outer region: 2.6 < |eta| <= 2.7
+    np.logical_and(~inner, central, out=scratch)
+    scratch &= neHEF < 0.90
+    scratch &= neEmEF < 0.99
+    jetidtight |= scratch
+
+    # endcap region: 2.7 < |eta| <= 3.0
+    np.less_equal(abseta, 3.0, out=scratch)
+    scratch &= ~central
+    scratch &= neHEF < 0.99
+    jetidtight |= scratch
+
+    # forward region: |eta| > 3.0
+    np.greater(abseta, 3.0, out=scratch)
+    scratch &= neMultiplicity >= 2
+    scratch &= neEmEF < 0.4
+    jetidtight |= scratch
+
+    jetidtightlepveto = central & jetidtight
+    jetidtightlepveto &= muEF < 0.8
+    jetidtightlepveto &= chEmEF < 0.8
+    np.logical_not(central, out=scratch)
+    scratch &= jetidtight
+    jetidtightlepveto |= scratch
+
+    return _pack_jetid_flags(jetidtight, jetidtightlepveto)
 
 
 def jetid_v14(jets: ak.Array) -> tuple[ak.Array, ak.Array]:
     """
     Jet ID fix for NanoAOD v14 copying
     # https://gitlab.cern.ch/cms-jetmet/coordination/coordination/-/issues/117#note_8880788
-    """
 
-    jetidtight = (
-        (
-            (np.abs(jets.eta) <= 2.6)
-            & (jets.neHEF < 0.99)
-            & (jets.neEmEF < 0.9)
-            & ((jets.chMultiplicity + jets.neMultiplicity) > 1)
-            & (jets.chHEF > 0.01)
-            & (jets.chMultiplicity > 0)
-        )
-        | (
-            ((np.abs(jets.eta) > 2.6) & (np.abs(jets.eta) <= 2.7))
-            & (jets.neHEF < 0.90)
-            & (jets.neEmEF < 0.99)
+    Flattens the jet buffers once, runs the ID kernel on contiguous numpy arrays, and
+    restores the event structure at the end.
+    """
+    counts = ak.num(jets.eta)
+    flags = _jetid_v14_flat(
+        *(
+            ak.to_numpy(ak.flatten(jets[field]))
+            for field in (
+                "eta",
+                "neHEF",
+                "neEmEF",
+                "chHEF",
+                "muEF",
+                "chEmEF",
+                "chMultiplicity",
+                "neMultiplicity",
+            )
         )
-        | (((np.abs(jets.eta) > 2.7) & (np.abs(jets.eta) <= 3.0)) & (jets.neHEF < 0.99))
-        | ((np.abs(jets.eta) > 3.0) & (jets.neMultiplicity >= 2) & (jets.neEmEF < 0.4))
     )
 
-    jetidtightlepveto = (
-        (np.abs(jets.eta) <= 2.7) & jetidtight & (jets.muEF < 0.8) & (jets.chEmEF < 0.8)
-    ) | ((np.abs(jets.eta) > 2.7) & jetidtight)
-
-    return jetidtight, jetidtightlepveto
+    return _unpack_jetid_flags(flags, counts)